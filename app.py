@@ -1,9 +1,9 @@
 import os
-import sys
+import uuid
 import unicodedata
-import subprocess
 from flask import Flask, request, render_template, jsonify
-from main import process_image, call_apps_script
+from main import process_image, call_apps_script, PUBLIC_APPS_SCRIPT_URL
+import async_io
 from spreadsheet_manager import (
     update_spreadsheet,
     get_striker_list_from_sheet,
@@ -12,6 +12,7 @@ from spreadsheet_manager import (
     get_other_icon,
     load_other_icon_cache
 )
+import search_cache
 
 app = Flask(__name__)
 
@@ -45,6 +46,10 @@ def match_team(query, target, side):
     """SP枠のみ順不同で一致判定"""
     return normalize_sp_chars(query, side) == normalize_sp_chars(target, side)
 
+def team_cache_key(side, chars):
+    """/api/search キャッシュのキー（match_team と同じくSP枠のみ順不同）"""
+    return (side, tuple(normalize_sp_chars(chars, side)))
+
 @app.route("/", methods=["GET", "POST"])
 def index():
     if request.method == "GET":
@@ -54,10 +59,13 @@ def index():
         return "画像ファイルが選択されていません。", 400
     uploads_dir = os.path.abspath("uploads")
     os.makedirs(uploads_dir, exist_ok=True)
-    file_path = os.path.join(uploads_dir, file.filename)
+    # 同時アップロードで上書きし合わないよう、保存名はサーバー側で一意に生成する
+    ext = os.path.splitext(file.filename)[1].lower()
+    file_path = os.path.join(uploads_dir, f"{uuid.uuid4().hex}{ext}")
     file.save(file_path)
     try:
-        row_data = process_image(file_path)
+        prenormalized = request.form.get("prenormalized") == "1"
+        row_data, confidence = process_image(file_path, prenormalized)
         labels = [
             "日付", "攻撃側プレイヤー", "攻撃結果",
             "攻撃キャラ1", "攻撃キャラ2", "攻撃キャラ3",
@@ -69,7 +77,8 @@ def index():
         return render_template(
             "confirm.html",
             row_data=row_data,
-            labels=labels
+            labels=labels,
+            confidence=confidence
         )
     except Exception as e:
         print(f"render_template失敗: {e}")
@@ -77,6 +86,8 @@ def index():
             "complete.html",
             message=f"エラーが発生しました: {e}"
         )
+    finally:
+        os.remove(file_path)
 
 @app.route("/confirm", methods=["POST"])
 def confirm():
@@ -87,32 +98,39 @@ def confirm():
         ]
         row_data = [unicodedata.normalize("NFKC", v) for v in row_data]
         update_spreadsheet(row_data)
-        subprocess.run(
-            [sys.executable, "call_gas.py"],
-            check=True
-        )
+    except Exception as e:
+        print(f"スプレッドシート更新エラー: {e}")
         return render_template(
             "complete.html",
-            message="アップロードが完了しました"
+            message=f"スプレッドシートの更新に失敗しました: {e}"
         )
-    except subprocess.CalledProcessError as e:
+    try:
+        # しらす式変換（call_gas.py と同じ一般公開デプロイ）を共有ループ経由で呼ぶ
+        result = call_apps_script(PUBLIC_APPS_SCRIPT_URL)
+        print("Apps Script 実行結果：", result)
+    except Exception as e:
         print(f"しらす式変換エラー: {e}")
         return render_template(
             "complete.html",
             message=f"しらす式変換が失敗しました: {e}"
         )
-    except Exception as e:
-        print(f"スプレッドシート更新エラー: {e}")
-        return render_template(
-            "complete.html",
-            message=f"スプレッドシートの更新に失敗しました: {e}"
-        )
+    finally:
+        # しらす式変換でキャラ名が書き換わるため、書き込み時の名前からは
+        # 影響するキーを特定できない。書き込みは稀なので全件破棄する
+        search_cache.clear()
+    return render_template(
+        "complete.html",
+        message="アップロードが完了しました"
+    )
 
 @app.route("/search")
 def search():
     try:
-        striker_list = get_striker_list_from_sheet()
-        special_list = get_special_list_from_sheet()
+        # STRIKER / SPECIAL シートは独立なので並行取得
+        striker_list, special_list = async_io.gather(
+            async_io.to_thread(get_striker_list_from_sheet),
+            async_io.to_thread(get_special_list_from_sheet)
+        )
     except Exception as e:
         print(f"キャラリスト取得エラー: {e}")
         striker_list = []
@@ -130,6 +148,12 @@ def api_search():
         if side not in ["attack", "defense"] or not isinstance(characters, list) or len(characters) != 6:
             return jsonify({"error": "Invalid parameters"}), 400
 
+        cache_key = team_cache_key(side, characters)
+        cached = search_cache.get(cache_key)
+        if cached is not None:
+            return app.response_class(cached, mimetype=app.json.mimetype)
+        cache_gen = search_cache.generation()
+
         # SP枠順不同で探す
         matched_rows = []
         for row in search_battlelog_output_sheet(characters, side):
@@ -214,7 +238,9 @@ def api_search():
                     "date": row.get("日付", ""),
                 })
         print("API返却データ:", response)
-        return jsonify({"results": response})
+        resp = jsonify({"results": response})
+        search_cache.put(cache_key, resp.get_data(), cache_gen)
+        return resp
     except Exception as e:
         print(f"/api/search エラー: {e}")
         return jsonify({"error": str(e)}), 500
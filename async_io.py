@@ -0,0 +1,76 @@
+import asyncio
+import threading
+import httpx
+
+# ========== 共有イベントループ ==========
+# Flask のビュー（gthread ワーカーの各スレッド）から外部 I/O を投げ込むための
+# 常駐ループ。HTTP クライアントや gRPC クライアントはこのループ上で使い回す。
+_loop = None
+_loop_lock = threading.Lock()
+_http_client = None
+# run / gather の既定の待ち時間（秒）。外部 I/O が詰まってもリクエストスレッドを解放する
+DEFAULT_TIMEOUT = 60
+
+def _get_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name="async-io", daemon=True)
+            thread.start()
+    return _loop
+
+def run(coro, timeout=DEFAULT_TIMEOUT):
+    """
+    同期コードからコルーチンを共有ループで実行し、結果を返す。
+    呼び出し元スレッドは結果待ちでブロックするだけで、I/O 自体はループ側で多重化される。
+    timeout 秒を過ぎたらコルーチンをキャンセルして TimeoutError を送出する。
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, _get_loop())
+    try:
+        return future.result(timeout)
+    except TimeoutError:
+        future.cancel()
+        raise TimeoutError(f"外部I/Oが{timeout}秒以内に完了しませんでした。")
+
+def gather(*coros, timeout=DEFAULT_TIMEOUT):
+    """
+    独立したコルーチンを並行実行し、結果をリストで返す（同期コード用）。
+    """
+    async def _gather():
+        return await asyncio.gather(*coros)
+    return run(_gather(), timeout)
+
+async def to_thread(func, *args, **kwargs):
+    """
+    gspread など同期ライブラリの呼び出しをスレッドプールに逃がして await 可能にする。
+    スレッド自体は止められないので、呼び出し側のライブラリにもタイムアウトを設定しておくこと。
+    """
+    return await asyncio.to_thread(func, *args, **kwargs)
+
+def get_http_client():
+    """
+    keep-alive 接続をプールする共有 AsyncClient を返す。ループ上から呼ぶこと。
+    """
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            follow_redirects=True,
+        )
+    return _http_client
+
+async def fetch_bytes(url):
+    """
+    URLの内容をバイト列で取得する。
+    """
+    resp = await get_http_client().get(url)
+    resp.raise_for_status()
+    return resp.content
+
+async def post_json(url, payload, headers=None):
+    """
+    JSON を POST してレスポンスを返す。ステータスの判定は呼び出し側で行う。
+    """
+    return await get_http_client().post(url, json=payload, headers=headers)
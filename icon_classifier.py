@@ -0,0 +1,125 @@
+import os
+import math
+import cv2
+import numpy as np
+
+# 前処理後（1611×696）の画像における固定ROI (x1, y1, x2, y2)
+# 盾/剣アイコン・Win/Lose ロゴの周辺を少し広めに取り、ROI内でテンプレートを探す
+SIDE_ICON_ROIS = {
+    "left":  (25, 105, 125, 205),
+    "right": (850, 105, 960, 205),
+}
+RESULT_ROIS = {
+    "left":  (115, 100, 290, 210),
+    "right": (935, 100, 1115, 210),
+}
+# プレイヤー名（"Lv.90 名前"）の帯。OCRはここだけにかける
+NAME_ROIS = {
+    "left":  (430, 95, 735, 145),
+    "right": (1265, 95, 1570, 145),
+}
+
+_ICON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "icons")
+_SCALES = (0.9, 1.0, 1.1, 1.2, 1.3, 1.4)
+# スコア差 → 信頼度 (0.5〜1.0) に変換するときの傾き
+_CONFIDENCE_GAIN = 8.0
+
+def _load_icon(name):
+    img = cv2.imread(os.path.join(_ICON_DIR, name), cv2.IMREAD_COLOR)
+    if img is None:
+        raise Exception(f"アイコン画像が読み込めませんでした: {name}")
+    return img
+
+def _color_hist(img):
+    """
+    背景（明るい低彩度）を除いた画素の H-S ヒストグラム。
+    Win（黄色）と Lose（灰色＋濃い縁取り）は色だけでもほぼ分離できる。
+    """
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    mask = ((hsv[:, :, 1] > 40) | (hsv[:, :, 2] < 160)).astype(np.uint8) * 255
+    hist = cv2.calcHist([hsv], [0, 1], mask, [30, 16], [0, 180, 0, 256])
+    cv2.normalize(hist, hist, 0, 1, cv2.NORM_MINMAX)
+    return hist
+
+_TEMPLATES = {
+    "ken":  _load_icon("ken.png"),
+    "tate": _load_icon("tate.png"),
+    "win":  _load_icon("win.png"),
+    "lose": _load_icon("lose.png"),
+}
+_HISTS = {
+    "win":  _color_hist(_TEMPLATES["win"]),
+    "lose": _color_hist(_TEMPLATES["lose"]),
+}
+
+def _crop(image, region):
+    x1, y1, x2, y2 = region
+    return image[y1:y2, x1:x2]
+
+def _match_score(roi, template):
+    """
+    複数スケールでテンプレートマッチングし、最大の TM_CCOEFF_NORMED 値と位置を返す。
+    """
+    best, best_box = -1.0, None
+    th, tw = template.shape[:2]
+    for s in _SCALES:
+        w, h = int(round(tw * s)), int(round(th * s))
+        if w > roi.shape[1] or h > roi.shape[0]:
+            continue
+        tmpl = cv2.resize(template, (w, h), interpolation=cv2.INTER_AREA)
+        res = cv2.matchTemplate(roi, tmpl, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(res)
+        if max_val > best:
+            best, best_box = max_val, (max_loc[0], max_loc[1], w, h)
+    return best, best_box
+
+def _result_score(roi, key):
+    """
+    Win/Lose ロゴのスコア：テンプレート一致度と色ヒストグラム相関の平均。
+    ヒストグラムはテンプレートが一致した位置の切り出しで取る。
+    """
+    tm, box = _match_score(roi, _TEMPLATES[key])
+    if box is None:
+        return tm
+    x, y, w, h = box
+    hist = _color_hist(roi[y:y+h, x:x+w])
+    hc = cv2.compareHist(hist, _HISTS[key], cv2.HISTCMP_CORREL)
+    return (tm + hc) / 2
+
+def _confidence(margin):
+    return 1.0 / (1.0 + math.exp(-_CONFIDENCE_GAIN * abs(margin)))
+
+def classify_battle(image):
+    """
+    前処理済み画像から攻撃側（左右）と左右の勝敗を判定する。
+    :return: {
+        "left_is_attacker": bool, "side_confidence": float,
+        "left_result": "Win"/"Lose", "right_result": "Win"/"Lose", "result_confidence": float,
+    }
+    """
+    side = {}
+    for pos, region in SIDE_ICON_ROIS.items():
+        roi = _crop(image, region)
+        side[pos] = {k: _match_score(roi, _TEMPLATES[k])[0] for k in ("ken", "tate")}
+    # 左が剣・右が盾 の仮説と、その逆の仮説を比較
+    left_atk = side["left"]["ken"] + side["right"]["tate"]
+    right_atk = side["left"]["tate"] + side["right"]["ken"]
+    side_margin = (left_atk - right_atk) / 2
+
+    result = {}
+    for pos, region in RESULT_ROIS.items():
+        roi = _crop(image, region)
+        result[pos] = {k: _result_score(roi, k) for k in ("win", "lose")}
+    left_win = result["left"]["win"] + result["right"]["lose"]
+    right_win = result["left"]["lose"] + result["right"]["win"]
+    result_margin = (left_win - right_win) / 2
+
+    print("Side icon scores:", side)
+    print("Result scores:", result)
+    return {
+        "left_is_attacker": side_margin >= 0,
+        "side_confidence": _confidence(side_margin),
+        "left_result": "Win" if result_margin >= 0 else "Lose",
+        "right_result": "Lose" if result_margin >= 0 else "Win",
+        "result_confidence": _confidence(result_margin),
+    }
@@ -1,47 +1,21 @@
 import os
+import re
+import json
+import threading
 import cv2
 import datetime
-import numpy as np
-import requests  # URLからの画像ダウンロード用
-import subprocess
 from google.oauth2.service_account import Credentials
 from google.auth.transport.requests import Request
 from spreadsheet_manager import update_spreadsheet
+from ocr_processing import perform_google_vision_ocr_batch_async
+from icon_classifier import classify_battle, NAME_ROIS
+import async_io
 
 # 日本時間 (JST) 定義
 JST = datetime.timezone(datetime.timedelta(hours=9))
 
-def get_template_urls():
-    """
-    Google スプレッドシートID "12rEszTQ20FdLoxBewBtz0kF8-MUt0TnBYrIwMj1E7c4"
-    の「sonotaicon」シートからテンプレート画像のURLを取得するプレースホルダ関数。
-    """
-    attack_url = "https://drive.google.com/uc?export=download&id=1fvs35cCs0aKtxNZ1hX_myjiA_RrPufmB"
-    defense_url = "https://drive.google.com/uc?export=download&id=17AdY1q9ZynxTNlBVUvJTmZMd220uC_bs"
-    return attack_url, defense_url
-
-def load_template(url):
-    """
-    URLからテンプレート画像をダウンロードし、80×80にリサイズして返す。
-    デバッグ用に "debug_template_resized.jpg" に保存。
-    """
-    response = requests.get(url)
-    response.raise_for_status()
-    arr = np.asarray(bytearray(response.content), dtype=np.uint8)
-    template = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-    template = cv2.resize(template, (80, 80))
-    cv2.imwrite("debug_template_resized.jpg", template)
-    print("Resized template image saved as 'debug_template_resized.jpg'.")
-    return template
-
-def match_icon(roi_img, template_img, thresh=0.5):
-    """
-    テンプレートマッチングで最大類似度が閾値以上か判定。
-    """
-    res = cv2.matchTemplate(roi_img, template_img, cv2.TM_CCOEFF_NORMED)
-    _, max_val, _, _ = cv2.minMaxLoc(res)
-    print("Template match max value:", max_val)
-    return max_val >= thresh
+# 前処理後の画像サイズ (幅, 高さ)。static/script.js のクライアント側前処理も同じ値を使う
+TARGET_SIZE = (1611, 696)
 
 def clean_text(text):
     """
@@ -49,9 +23,10 @@ def clean_text(text):
     """
     return "".join(text.replace('*','').replace('\n','').replace('\r','').split())
 
-def preprocess_image(image_path):
+def preprocess_image(image_path, prenormalized=False):
     """
     画像の前処理：グレースケール→二値化→最大輪郭でクロップ→1611×696にリサイズ。
+    prenormalized=True かつ既に1611×696の場合は、ブラウザ側でクロップ済みとみなしてそのまま返す。
     """
     print("Attempting to load image from:", image_path)
     if not os.path.exists(image_path):
@@ -59,6 +34,9 @@ def preprocess_image(image_path):
     img = cv2.imread(image_path)
     if img is None:
         raise Exception("画像が読み込めませんでした。")
+    if prenormalized and (img.shape[1], img.shape[0]) == TARGET_SIZE:
+        print("Pre-normalized upload; skipping crop/resize.")
+        return img
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     blurred = cv2.GaussianBlur(gray, (5,5), 0)
     _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
@@ -68,108 +46,41 @@ def preprocess_image(image_path):
         cropped = img[y:y+h, x:x+w]
     else:
         cropped = img
-    resized = cv2.resize(cropped, (1611,696), interpolation=cv2.INTER_AREA)
+    resized = cv2.resize(cropped, TARGET_SIZE, interpolation=cv2.INTER_AREA)
     return resized
 
-def mask_regions(image):
+def encode_jpeg(image):
     """
-    指定領域を白で塗りつぶしてマスク。
+    画像をJPEGバイト列にエンコード（一時ファイルを介さずにOCRへ渡す用）。
     """
-    cv2.rectangle(image, (425,150), (700,225), (255,255,255), -1)
-    cv2.rectangle(image, (1260,150), (1535,225), (255,255,255), -1)
-    cv2.rectangle(image, (0,240), (1611,565), (255,255,255), -1)
-    return image
+    ok, buf = cv2.imencode(".jpg", image)
+    if not ok:
+        raise Exception("画像のエンコードに失敗しました。")
+    return buf.tobytes()
 
-def parse_ocr_text(ocr_text):
+def parse_player_name(text):
     """
-    ヘッダー部のLv.表記・Win/Loseを解析して左右プレイヤー名と結果を返す。
+    名前帯のOCR結果（"Lv.90 名前"）からレベル表記を除いてプレイヤー名を返す。
     """
-    lines = [l.strip() for l in ocr_text.splitlines() if l.strip()]
-    try:
-        vs_idx = lines.index("VS")
-    except ValueError:
-        vs_idx = None
-    header = lines[:vs_idx] if vs_idx is not None else lines[:len(lines)//2]
-    lv_entries = [(i, l) for i,l in enumerate(header) if l.startswith("Lv.")]
-    if len(lv_entries) >= 2:
-        left_idx, left_line = lv_entries[0]
-        right_idx, right_line = lv_entries[1]
-        left_name = left_line.replace("Lv.90","").strip()
-        right_name = right_line.replace("Lv.90","").strip()
-    else:
-        left_name, right_name = "LeftPlayer","RightPlayer"
-        left_idx = right_idx = -1
-    win_pos  = [i for i,l in enumerate(header) if "Win" in l]
-    lose_pos = [i for i,l in enumerate(header) if "Lose" in l]
-    # 左右の最短距離でWin/Loseを割当て
-    if win_pos and lose_pos:
-        lw = min(abs(left_idx - p) for p in win_pos)
-        ll = min(abs(left_idx - p) for p in lose_pos)
-        if lw <= ll:
-            left_res, right_res = "Win","Lose"
-        else:
-            left_res, right_res = "Lose","Win"
-    elif win_pos:
-        lw = min(abs(left_idx - p) for p in win_pos)
-        rw = min(abs(right_idx - p) for p in win_pos)
-        if lw <= rw:
-            left_res, right_res = "Win","Lose"
-        else:
-            left_res, right_res = "Lose","Win"
-    elif lose_pos:
-        ll = min(abs(left_idx - p) for p in lose_pos)
-        rl = min(abs(right_idx - p) for p in lose_pos)
-        if ll <= rl:
-            left_res, right_res = "Lose","Win"
-        else:
-            left_res, right_res = "Win","Lose"
-    else:
-        left_res = right_res = ""
-    return left_name, left_res, right_name, right_res, None, None
-
-def ocr_region(image, region):
-    """
-    指定領域からOCRを実行し、clean_textして返す。
-    """
-    x1,y1,x2,y2 = region
-    sub = image[y1:y2, x1:x2]
-    tmp = "temp_region.jpg"
-    cv2.imwrite(tmp, sub)
-    from ocr_processing import perform_google_vision_ocr
-    text = perform_google_vision_ocr(tmp)
-    os.remove(tmp)
-    return clean_text(text)
-
-def process_image(image_path):
-    """
-    画像を受け取って以下を実行し、row_dataを返す。
-      1. 前処理＋マスク
-      2. OCR (ヘッダー部抽出)
-      3. parse_ocr_text で左右名＆結果
-      4. アイコンROI取得＋テンプレマッチ
-      5. キャラ領域OCR（攻撃側・防衛側を動的に割り当て）
-      6. row_data組立て
-    """
-    img = preprocess_image(image_path)
-    masked = mask_regions(img.copy())
-    cv2.imwrite("debug_preprocessed.jpg", masked)
-    tmp = "temp_preprocessed.jpg"
-    cv2.imwrite(tmp, masked)
-    from ocr_processing import perform_google_vision_ocr
-    full_text = perform_google_vision_ocr(tmp)
-    os.remove(tmp)
-    print("OCR recognized text (header extraction):")
-    print(full_text)
-
-    left_name, left_res, right_name, right_res, _, _ = parse_ocr_text(full_text)
-
-    # アイコンROI
-    roi = img[115:195, 35:115]
-    cv2.imwrite("debug_icon_roi.jpg", roi)
-    attack_url, _ = get_template_urls()
-    template = load_template(attack_url)
-    left_sword = match_icon(roi, template, thresh=0.4)
-    print("Left has sword:", left_sword)
+    text = " ".join(l.strip() for l in text.splitlines() if l.strip())
+    return re.sub(r"^Lv\.?\s*\d*", "", text).strip()
+
+def process_image(image_path, prenormalized=False):
+    """
+    画像を受け取って以下を実行し、(row_data, confidence) を返す。
+      1. 前処理（prenormalized=True ならクロップ・リサイズを省略）
+      2. 固定ROIのアイコン・色判定で攻撃側と左右の勝敗を判定（ローカル処理）
+      3. 名前帯2つ＋キャラ領域12個を1回の一括リクエストでOCR
+      4. 攻撃側・防衛側を動的に割り当ててrow_data組立て
+    confidence は {"side": 攻撃側判定の信頼度, "result": 勝敗判定の信頼度}（0.5〜1.0）。
+    """
+    img = preprocess_image(image_path, prenormalized)
+
+    judged = classify_battle(img)
+    left_sword = judged["left_is_attacker"]
+    left_res, right_res = judged["left_result"], judged["right_result"]
+    print("Left has sword:", left_sword, "confidence:", judged["side_confidence"])
+    print("Left result:", left_res, "confidence:", judged["result_confidence"])
 
     # キャラ領域座標
     left_regs = [(87,637,183,680),(186,637,280,680),(284,637,379,680),
@@ -177,49 +88,78 @@ def process_image(image_path):
     right_regs= [(922,637,1017,680),(1020,637,1115,680),(1118,637,1213,680),
                  (1216,637,1311,680),(1314,637,1409,680),(1412,637,1512,680)]
 
+    # 名前帯2つ・キャラ12領域の切り出しを1回の Vision 一括リクエストで OCR
+    regions = [NAME_ROIS["left"], NAME_ROIS["right"]] + left_regs + right_regs
+    crops = [encode_jpeg(img[y1:y2, x1:x2]) for x1, y1, x2, y2 in regions]
+    texts = async_io.run(perform_google_vision_ocr_batch_async(crops))
+    left_name = parse_player_name(texts[0]) or "LeftPlayer"
+    right_name = parse_player_name(texts[1]) or "RightPlayer"
+    chars = [clean_text(t) for t in texts[2:]]
+    left_chars, right_chars = chars[:6], chars[6:]
+
     # プレイヤー・キャラ割当（攻撃側が左なら left_regsが攻撃キャラ、右なら逆）
     if left_sword:
         atk_name, atk_res = left_name, left_res
         def_name, def_res = right_name, right_res
-        atk_chars  = [ocr_region(img, r) for r in left_regs]
-        def_chars  = [ocr_region(img, r) for r in right_regs]
+        atk_chars, def_chars = left_chars, right_chars
     else:
         atk_name, atk_res = right_name, right_res
         def_name, def_res = left_name, left_res
-        atk_chars  = [ocr_region(img, r) for r in right_regs]
-        def_chars  = [ocr_region(img, r) for r in left_regs]
+        atk_chars, def_chars = right_chars, left_chars
 
     # 日付・結果行組立
     date_str = datetime.datetime.now(JST).strftime("%Y-%m-%d %H:%M:%S")
     row = [date_str, atk_name, atk_res] + atk_chars + [""] + [def_name, def_res] + def_chars
-    return row
-
-def call_apps_script():
+    confidence = {
+        "side": judged["side_confidence"],
+        "result": judged["result_confidence"],
+    }
+    return row, confidence
+
+# Apps Script デプロイURL（CLI用 / Webアプリ用＝call_gas.py と同じ一般公開デプロイ）
+APPS_SCRIPT_URL = 'https://script.google.com/macros/s/AKfycby6jamSogeLKTtla3A90hnweRLyRc-E3XryNXeA07nVsJAQy2Dj1pRNfce6WaSm2dwb/exec'
+PUBLIC_APPS_SCRIPT_URL = 'https://script.google.com/macros/s/AKfycbxeVuTIfvZXAMq4eNjmbnJtKvekI_P4dEhFw8UFudjxueERD-dL5pVFYgABwSGXjls6/exec'
+
+_apps_script_creds = None
+_apps_script_creds_lock = threading.Lock()
+
+def _get_apps_script_token():
+    """
+    サービスアカウント認証で Apps Script 用の token を取得（同期・ブロッキング）。
+    認証情報は使い回し、期限切れのときだけ更新する。
+    """
+    global _apps_script_creds
+    with _apps_script_creds_lock:
+        if _apps_script_creds is None:
+            cred_cont = os.environ.get("credentials")
+            if not cred_cont:
+                raise Exception("Environment variable 'credentials' is not set or empty.")
+            SCOPES = ['https://www.googleapis.com/auth/script.external_request']
+            _apps_script_creds = Credentials.from_service_account_info(json.loads(cred_cont), scopes=SCOPES)
+        if not _apps_script_creds.valid or _apps_script_creds.expired:
+            _apps_script_creds.refresh(Request())
+        return _apps_script_creds.token
+
+async def call_apps_script_async(url=APPS_SCRIPT_URL):
     """
     Apps Script 呼び出し。サービスアカウント認証で token を取得し POST。
     """
-    cred_cont = os.environ.get("credentials")
-    if not cred_cont:
-        raise Exception("Environment variable 'credentials' is not set or empty.")
-    tmp = "/tmp/google_credentials.json"
-    with open(tmp, "w") as f:
-        f.write(cred_cont)
-
-    SCOPES = ['https://www.googleapis.com/auth/script.external_request']
-    creds = Credentials.from_service_account_file(tmp, scopes=SCOPES)
-    if not creds.valid or creds.expired:
-        creds.refresh(Request())
-    token = creds.token
+    token = await async_io.to_thread(_get_apps_script_token)
 
-    url = 'https://script.google.com/macros/s/AKfycby6jamSogeLKTtla3A90hnweRLyRc-E3XryNXeA07nVsJAQy2Dj1pRNfce6WaSm2dwb/exec'
     payload = {'function': 'main'}
     headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
 
-    resp = requests.post(url, headers=headers, json=payload)
+    resp = await async_io.post_json(url, payload, headers=headers)
     if resp.status_code != 200:
         raise Exception(f"Error calling Apps Script: {resp.status_code} {resp.text}")
     return resp.text
 
+def call_apps_script(url=APPS_SCRIPT_URL):
+    """
+    call_apps_script_async の同期版。
+    """
+    return async_io.run(call_apps_script_async(url))
+
 def main():
     """
     CLI実行用。引数に画像パスを渡すと、一連の処理を行う。
@@ -229,7 +169,8 @@ def main():
         print("Usage: python main.py <image_path>")
         sys.exit(1)
     path = sys.argv[1]
-    row = process_image(path)
+    row, confidence = process_image(path)
+    print("判定の信頼度:", confidence)
 
     # スプレッドシート更新
     update_spreadsheet(row)
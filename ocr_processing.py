@@ -18,6 +18,42 @@ def perform_google_vision_ocr(image_path):
     else:
         return ""
 
+_async_client = None
+# Vision RPC のタイムアウト（秒）。クライアント既定の数分待ちを避ける
+VISION_TIMEOUT = 30
+
+# batch_annotate_images 1回あたりの画像数上限
+VISION_BATCH_LIMIT = 16
+
+async def perform_google_vision_ocr_batch_async(contents):
+    """
+    Google Cloud Vision OCR の非同期・一括版。async_io の共有ループ上で呼ぶこと。
+    複数画像を1回の batch_annotate_images でまとめて送る（最大16枚）。
+    :param contents: 画像のバイト列（JPEG等）のリスト
+    :return: 認識されたテキスト（文字列）のリスト（contents と同じ順）
+    """
+    global _async_client
+    if len(contents) > VISION_BATCH_LIMIT:
+        raise Exception(f"Vision API の一括リクエストは{VISION_BATCH_LIMIT}枚までです: {len(contents)}")
+    if _async_client is None:
+        # gRPC の非同期チャネルはループに紐づくため、ループ上で一度だけ生成して使い回す
+        _async_client = vision.ImageAnnotatorAsyncClient()
+    requests = [
+        vision.AnnotateImageRequest(
+            image=vision.Image(content=content),
+            features=[vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)],
+        )
+        for content in contents
+    ]
+    response = await _async_client.batch_annotate_images(requests=requests, timeout=VISION_TIMEOUT)
+    texts = []
+    for result in response.responses:
+        if result.error.message:
+            raise Exception(f"Vision API error: {result.error.message}")
+        annotations = result.text_annotations
+        texts.append(annotations[0].description.strip() if annotations else "")
+    return texts
+
 # テスト用の実行
 if __name__ == "__main__":
     image_path = "uploads/battle.jpg"  # OCRをかける画像
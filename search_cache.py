@@ -0,0 +1,48 @@
+import time
+import threading
+from collections import OrderedDict
+
+# ========== /api/search のレスポンスキャッシュ ==========
+# キー: (side, SP枠を並べ替えた6キャラのタプル) / 値: (保存時刻, シリアライズ済みレスポンスbytes)
+# 件数上限を超えたら最も古く参照されたものから捨てる（LRU）。
+# /confirm で書き込みがあったら clear で全件破棄する。
+# clear 前にシートを読んだ検索結果が clear 後に書き戻されないよう、世代番号で弾く。
+# シートを直接編集された場合に備えて、一定時間で失効させる。
+# キャッシュも clear もプロセス内でしか効かないため、1プロセス（Procfile の --workers 1）
+# ＋スレッドで動かす前提。ワーカーを増やすと他プロセスの古い結果が残る。
+_MAX_ENTRIES = 256
+_MAX_AGE_SEC = 600
+_cache = OrderedDict()
+_lock = threading.Lock()
+_generation = 0
+
+def get(key):
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        stored_at, body = entry
+        if time.monotonic() - stored_at > _MAX_AGE_SEC:
+            del _cache[key]
+            return None
+        _cache.move_to_end(key)
+        return body
+
+def generation():
+    with _lock:
+        return _generation
+
+def put(key, body, gen):
+    with _lock:
+        if gen != _generation:
+            return
+        _cache[key] = (time.monotonic(), body)
+        _cache.move_to_end(key)
+        while len(_cache) > _MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+def clear():
+    global _generation
+    with _lock:
+        _generation += 1
+        _cache.clear()
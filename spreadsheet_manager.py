@@ -1,26 +1,39 @@
 import os
 import gspread
+import threading
 from google.oauth2.service_account import Credentials
 
-def update_spreadsheet(data):
+# ========== gspread クライアントの使い回し ==========
+# 認証済みセッション（keep-alive 接続・アクセストークン）を呼び出しごとに作り直さない。
+_clients = {}
+_clients_lock = threading.Lock()
+SHEETS_TIMEOUT = 30
+
+def get_client(creds_path=None):
     SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-    creds_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
+    if creds_path is None:
+        creds_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
     if not creds_path:
         raise Exception("GOOGLE_APPLICATION_CREDENTIALS environment variable is not set.")
-    creds = Credentials.from_service_account_file(creds_path, scopes=SCOPES)
-    client = gspread.authorize(creds)
+    with _clients_lock:
+        client = _clients.get(creds_path)
+        if client is None:
+            creds = Credentials.from_service_account_file(creds_path, scopes=SCOPES)
+            client = gspread.authorize(creds)
+            # to_thread 経由の呼び出しが詰まり続けないよう、HTTP にタイムアウトを設定
+            client.set_timeout(SHEETS_TIMEOUT)
+            _clients[creds_path] = client
+    return client
+
+def update_spreadsheet(data):
+    client = get_client()
     SPREADSHEET_ID = "1U3lnPymCu4o0VPQgW02ybkq6tGzz7UHYLmDlXmpl9_s"  # 戦闘ログ
     worksheet = client.open_by_key(SPREADSHEET_ID).worksheet("戦闘ログ")
     worksheet.insert_row(data, 3)
     print("スプレッドシートを更新しました:", data)
 
 def get_striker_list_from_sheet():
-    SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-    creds_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
-    if not creds_path:
-        raise Exception("GOOGLE_APPLICATION_CREDENTIALS environment variable is not set.")
-    creds = Credentials.from_service_account_file(creds_path, scopes=SCOPES)
-    client = gspread.authorize(creds)
+    client = get_client()
     SPREADSHEET_ID = "1rDQbwsNtNVaSmX04tZaf7AOX0AnPNhKSee1wv4myVTQ"  # キャラデータ管理
     worksheet = client.open_by_key(SPREADSHEET_ID).worksheet("STRIKER")
     records = worksheet.get_all_records()
@@ -33,12 +46,7 @@ def get_striker_list_from_sheet():
     return char_list
 
 def get_special_list_from_sheet():
-    SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-    creds_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
-    if not creds_path:
-        raise Exception("GOOGLE_APPLICATION_CREDENTIALS environment variable is not set.")
-    creds = Credentials.from_service_account_file(creds_path, scopes=SCOPES)
-    client = gspread.authorize(creds)
+    client = get_client()
     SPREADSHEET_ID = "1rDQbwsNtNVaSmX04tZaf7AOX0AnPNhKSee1wv4myVTQ"  # キャラデータ管理
     worksheet = client.open_by_key(SPREADSHEET_ID).worksheet("SPECIAL")
     records = worksheet.get_all_records()
@@ -57,12 +65,7 @@ _other_icon_cache = {}
 
 def load_other_icon_cache():
     global _other_icon_cache
-    SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-    creds_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
-    if not creds_path:
-        raise Exception("GOOGLE_APPLICATION_CREDENTIALS environment variable is not set.")
-    creds = Credentials.from_service_account_file(creds_path, scopes=SCOPES)
-    client = gspread.authorize(creds)
+    client = get_client()
     ws = client.open_by_key(_OTHER_ICON_SPREADSHEET_ID).worksheet(_OTHER_ICON_SHEET)
     records = ws.get_all_records()
     cache = {}
@@ -115,12 +118,8 @@ def normalize(s):
 def search_battlelog_output_sheet(query, search_side):
     SPREADSHEET_ID = "1ix6hz4s0AinsepfSHNZ6CMAsNSRW-3l8nJUMBR2DpLQ"
     SHEET_NAME = "出力結果"
-    SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
     creds_path = os.environ.get("GOOGLE_APPLICATIONS_CREDENTIALS", os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"))
-    if not creds_path:
-        raise Exception("GOOGLE_APPLICATION_CREDENTIALS environment variable is not set.")
-    creds = Credentials.from_service_account_file(creds_path, scopes=SCOPES)
-    client = gspread.authorize(creds)
+    client = get_client(creds_path)
     worksheet = client.open_by_key(SPREADSHEET_ID).worksheet(SHEET_NAME)
 
     all_records = get_sheet_records_with_empty_safe(worksheet, head_row=2)
@@ -22,3 +22,236 @@ document.getElementById("imageInput").addEventListener("change", function () {
   };
   reader.readAsDataURL(file);
 });
+
+// ========== アップロード前のクロップ＋縮小 ==========
+// サーバー側 preprocess_image と同じく「ぼかし→大津の二値化→最大輪郭でクロップ→1611×696にリサイズ」を
+// ブラウザで行い、JPEGに再エンコードして送る（数MBのスクショを数百KBに）。
+// サーバーはこの結果の固定座標をそのまま読むため、領域検出は原寸で行い、
+// 最大領域の選び方も cv2.contourArea（外輪郭の内側の面積）に合わせる。
+// 失敗した場合は元画像をそのまま送信し、サーバー側で従来どおり処理する。
+const TARGET_WIDTH = 1611;
+const TARGET_HEIGHT = 696;
+const MAX_ANALYSIS_WIDTH = 3200;  // これを超える画像のみ縮小して領域検出する
+const JPEG_QUALITY = 0.9;
+
+function loadImage(file) {
+  return new Promise((resolve, reject) => {
+    const url = URL.createObjectURL(file);
+    const img = new Image();
+    img.onload = () => { URL.revokeObjectURL(url); resolve(img); };
+    img.onerror = () => { URL.revokeObjectURL(url); reject(new Error("画像を読み込めませんでした")); };
+    img.src = url;
+  });
+}
+
+// cv2.GaussianBlur(gray, (5,5), 0) 相当（カーネル [1,4,6,4,1]/16, BORDER_REFLECT_101）
+function gaussianBlur5(gray, w, h) {
+  const k = [1, 4, 6, 4, 1];
+  const reflect = (i, n) => {
+    if (n === 1) return 0;
+    while (i < 0 || i >= n) i = i < 0 ? -i : 2 * n - 2 - i;
+    return i;
+  };
+  const tmp = new Uint16Array(w * h);
+  for (let y = 0; y < h; y++) {
+    const row = y * w;
+    for (let x = 0; x < w; x++) {
+      let acc = 0;
+      for (let d = -2; d <= 2; d++) acc += k[d + 2] * gray[row + reflect(x + d, w)];
+      tmp[row + x] = acc;
+    }
+  }
+  const out = new Uint8Array(w * h);
+  for (let y = 0; y < h; y++) {
+    for (let x = 0; x < w; x++) {
+      let acc = 0;
+      for (let d = -2; d <= 2; d++) acc += k[d + 2] * tmp[reflect(y + d, h) * w + x];
+      out[y * w + x] = Math.round(acc / 256);
+    }
+  }
+  return out;
+}
+
+// 大津の二値化のしきい値
+function otsuThreshold(gray) {
+  const hist = new Array(256).fill(0);
+  for (let i = 0; i < gray.length; i++) hist[gray[i]]++;
+  const total = gray.length;
+  let sumAll = 0;
+  for (let t = 0; t < 256; t++) sumAll += t * hist[t];
+  let sumB = 0, wB = 0, best = 0, bestVar = -1;
+  for (let t = 0; t < 256; t++) {
+    wB += hist[t];
+    if (wB === 0) continue;
+    const wF = total - wB;
+    if (wF === 0) break;
+    sumB += t * hist[t];
+    const mB = sumB / wB;
+    const mF = (sumAll - sumB) / wF;
+    const between = wB * wF * (mB - mF) * (mB - mF);
+    if (between > bestVar) { bestVar = between; best = t; }
+  }
+  return best;
+}
+
+// 白領域を8近傍でラベリングし、各領域の外接矩形を返す（labels は 1 始まり）
+function labelRegions(binary, w, h) {
+  const labels = new Int32Array(w * h);
+  const stack = new Int32Array(w * h);
+  const regions = [];
+  for (let start = 0; start < w * h; start++) {
+    if (!binary[start] || labels[start]) continue;
+    const id = regions.length + 1;
+    let top = 0;
+    stack[top++] = start;
+    labels[start] = id;
+    let minX = w, minY = h, maxX = 0, maxY = 0;
+    while (top > 0) {
+      const p = stack[--top];
+      const x = p % w, y = (p - x) / w;
+      if (x < minX) minX = x;
+      if (x > maxX) maxX = x;
+      if (y < minY) minY = y;
+      if (y > maxY) maxY = y;
+      for (let dy = -1; dy <= 1; dy++) {
+        const ny = y + dy;
+        if (ny < 0 || ny >= h) continue;
+        for (let dx = -1; dx <= 1; dx++) {
+          const nx = x + dx;
+          if (nx < 0 || nx >= w) continue;
+          const n = ny * w + nx;
+          if (binary[n] && !labels[n]) {
+            labels[n] = id;
+            stack[top++] = n;
+          }
+        }
+      }
+    }
+    regions.push({ id, x: minX, y: minY, w: maxX - minX + 1, h: maxY - minY + 1 });
+  }
+  return { labels, regions };
+}
+
+// 領域の外輪郭の内側の面積（穴も含む）。外接矩形の外周から、その領域を壁として
+// 4近傍で塗りつぶし、届かなかった画素数を数える
+function filledArea(labels, w, region) {
+  const bw = region.w + 2, bh = region.h + 2;
+  const outside = new Uint8Array(bw * bh);
+  const stack = new Int32Array(bw * bh);
+  const isWall = (bx, by) => {
+    const x = region.x + bx - 1, y = region.y + by - 1;
+    if (bx === 0 || by === 0 || bx === bw - 1 || by === bh - 1) return false;
+    return labels[y * w + x] === region.id;
+  };
+  let top = 0, reached = 0;
+  stack[top++] = 0;
+  outside[0] = 1;
+  while (top > 0) {
+    const p = stack[--top];
+    reached++;
+    const bx = p % bw, by = (p - bx) / bw;
+    const next = [[bx - 1, by], [bx + 1, by], [bx, by - 1], [bx, by + 1]];
+    for (const [nx, ny] of next) {
+      if (nx < 0 || ny < 0 || nx >= bw || ny >= bh) continue;
+      const n = ny * bw + nx;
+      if (!outside[n] && !isWall(nx, ny)) {
+        outside[n] = 1;
+        stack[top++] = n;
+      }
+    }
+  }
+  return bw * bh - reached;
+}
+
+// cv2.contourArea 最大の領域を選ぶ。面積は外接矩形以下なので、矩形の大きい順に調べて打ち切る
+function findLargestRegion(binary, w, h) {
+  const { labels, regions } = labelRegions(binary, w, h);
+  regions.sort((a, b) => b.w * b.h - a.w * a.h);
+  let best = null, bestArea = -1;
+  for (const region of regions) {
+    if (region.w * region.h <= bestArea) break;
+    const area = filledArea(labels, w, region);
+    if (area > bestArea) { bestArea = area; best = region; }
+  }
+  return best;
+}
+
+async function normalizeScreenshot(file) {
+  const img = await loadImage(file);
+  const scale = Math.min(1, MAX_ANALYSIS_WIDTH / img.naturalWidth);
+  const aw = Math.max(1, Math.round(img.naturalWidth * scale));
+  const ah = Math.max(1, Math.round(img.naturalHeight * scale));
+
+  const analysis = document.createElement("canvas");
+  analysis.width = aw;
+  analysis.height = ah;
+  const actx = analysis.getContext("2d", { willReadFrequently: true });
+  actx.drawImage(img, 0, 0, aw, ah);
+  const pixels = actx.getImageData(0, 0, aw, ah).data;
+  const gray = new Uint8Array(aw * ah);
+  for (let i = 0; i < gray.length; i++) {
+    gray[i] = Math.round(0.299 * pixels[i * 4] + 0.587 * pixels[i * 4 + 1] + 0.114 * pixels[i * 4 + 2]);
+  }
+  const blurred = gaussianBlur5(gray, aw, ah);
+  const thresh = otsuThreshold(blurred);
+  const binary = new Uint8Array(aw * ah);
+  for (let i = 0; i < blurred.length; i++) binary[i] = blurred[i] > thresh ? 1 : 0;
+
+  const region = findLargestRegion(binary, aw, ah);
+  let sx = 0, sy = 0, sw = img.naturalWidth, sh = img.naturalHeight;
+  if (region) {
+    sx = region.x / scale;
+    sy = region.y / scale;
+    sw = Math.min(region.w / scale, img.naturalWidth - sx);
+    sh = Math.min(region.h / scale, img.naturalHeight - sy);
+  }
+
+  const out = document.createElement("canvas");
+  out.width = TARGET_WIDTH;
+  out.height = TARGET_HEIGHT;
+  const octx = out.getContext("2d");
+  octx.imageSmoothingEnabled = true;
+  octx.imageSmoothingQuality = "high";
+  octx.drawImage(img, sx, sy, sw, sh, 0, 0, TARGET_WIDTH, TARGET_HEIGHT);
+  const blob = await new Promise(resolve => out.toBlob(resolve, "image/jpeg", JPEG_QUALITY));
+  if (!blob) throw new Error("JPEGへの変換に失敗しました");
+  // 保存名はサーバー側で生成するので、ここでは拡張子だけ意味を持つ
+  return new File([blob], "battle.jpg", { type: "image/jpeg" });
+}
+
+const uploadForm = document.getElementById("upload-form");
+const uploadButton = uploadForm.querySelector("button[type=submit]");
+const uploadButtonLabel = uploadButton.textContent;
+
+uploadForm.addEventListener("submit", async function (e) {
+  const form = this;
+  if (form.dataset.normalized === "1") return;  // 変換後の再送信
+  const input = document.getElementById("imageInput");
+  const file = input.files[0];
+  if (!file) return;
+  e.preventDefault();
+  uploadButton.disabled = true;
+  uploadButton.textContent = "処理中…";
+  // 原寸の領域検出はメインスレッドを占有するので、先にボタン表示を反映させる
+  await new Promise(resolve => requestAnimationFrame(() => setTimeout(resolve, 0)));
+  try {
+    const normalized = await normalizeScreenshot(file);
+    const dt = new DataTransfer();
+    dt.items.add(normalized);
+    input.files = dt.files;
+    document.getElementById("prenormalizedInput").value = "1";
+  } catch (err) {
+    console.warn("クライアント側の前処理をスキップします:", err);
+    document.getElementById("prenormalizedInput").value = "0";
+  }
+  form.dataset.normalized = "1";
+  form.submit();
+});
+
+// 戻るボタンで bfcache から復元されたとき、送信中の状態を元に戻す
+window.addEventListener("pageshow", function () {
+  uploadButton.disabled = false;
+  uploadButton.textContent = uploadButtonLabel;
+  delete uploadForm.dataset.normalized;
+  document.getElementById("prenormalizedInput").value = "0";
+});